@@ -1,6 +1,9 @@
 import os
 import re
 import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Any, List, Dict, Tuple
 
@@ -9,6 +12,25 @@ from app.log import logger
 from app.plugins import _PluginBase
 from app.schemas.types import EventType, NotificationType
 
+# 一次扫描同时匹配明确的集数标志（S01E01, EP01, 第1集, E01）和普通数字
+_EP_COMBINED = re.compile(r'(?:(?:e|ep|第)\s*(?P<ep>\d+))|(?P<num>\d+)', re.IGNORECASE)
+# 常见的分辨率/编码数字，不能当作集数
+_RES_TOKENS = frozenset({264, 265, 720, 480, 1080, 2160, 576, 360})
+_NAT_SPLIT = re.compile(r'(\d+)')
+# 用户态复制的缓冲区大小，1MiB 在各种文件大小下都优于默认值
+_COPY_BUFSIZE = 1 << 20
+# 批量硬链接时每次 cp 调用传入的文件数，避免超出命令行长度限制
+_BULK_LINK_CHUNK = 1000
+
+
+def _natkey(name):
+    """自然排序键：数字段按数值比较，使 ep2 排在 ep10 之前"""
+    parts = _NAT_SPLIT.split(name)
+    # split 带捕获组时奇数位一定是数字段
+    parts[1::2] = map(int, parts[1::2])
+    return tuple(parts)
+
+
 class ForceManualTransfer(_PluginBase):
     # 插件名称
     plugin_name = "强制手动整理(免TMDB)"
@@ -34,9 +56,12 @@ class ForceManualTransfer(_PluginBase):
     _media_name = ""
     _season = 1
     _transfer_type = "softlink"
+    _bulk_link = False
+    # 整理方式对应的操作函数，在 init_plugin 中根据配置确定
+    _op = os.symlink
     
     # 支持强制整理的扩展名（包含你的 strm）
-    _exts = ['.strm', '.mp4', '.mkv', '.ts', '.avi', '.rmvb', '.wmv', '.mov', '.flv', '.ass', '.srt', '.nfo']
+    _EXTS_TUPLE = ('.strm', '.mp4', '.mkv', '.ts', '.avi', '.rmvb', '.wmv', '.mov', '.flv', '.ass', '.srt', '.nfo')
 
     def init_plugin(self, config: dict = None):
         if config:
@@ -47,6 +72,14 @@ class ForceManualTransfer(_PluginBase):
             self._media_name = config.get("media_name")
             self._season = config.get("season", 1)
             self._transfer_type = config.get("transfer_type", "softlink")
+            self._bulk_link = config.get("bulk_link")
+            # 整理方式只在初始化时分派一次，整理时直接调用
+            self._op = {
+                "move": shutil.move,
+                "copy": self._fast_copy,
+                "link": os.link,
+                "softlink": os.symlink,
+            }.get(self._transfer_type, os.symlink)
 
             # 如果开启了“立即运行”，则执行任务
             if self._enabled and self._run_now:
@@ -58,17 +91,150 @@ class ForceManualTransfer(_PluginBase):
 
     def _get_episode(self, filename):
         """智能提取文件名中的集数"""
-        # 1. 优先匹配 S01E01, EP01, 第1集, E01 这种明确的集数
-        match = re.search(r'(?i)(?:e|ep|第)\s*(\d+)', filename)
-        if match:
-            return int(match.group(1))
-        # 2. 如果没有明确标志，提取文件名里出现的最后一段数字（过滤掉分辨率）
-        numbers = re.findall(r'(\d+)', filename)
-        valid_nums = [int(n) for n in numbers if int(n) < 1000 and int(n) not in [264, 265, 720, 480]]
+        # 1. 优先使用 S01E01, EP01, 第1集, E01 这种明确的集数
+        # 2. 如果没有明确标志，取文件名里出现的最后一段数字（过滤掉分辨率）
+        numbers = []
+        for m in _EP_COMBINED.finditer(filename):
+            ep = m.group('ep')
+            if ep is not None:
+                return int(ep)
+            numbers.append(int(m.group('num')))
+        valid_nums = [n for n in numbers if n < 1000 and n not in _RES_TOKENS]
         if valid_nums:
             return valid_nums[-1]
         return None
 
+    @staticmethod
+    def _fast_copy(src, dst):
+        """复制文件：优先用 copy_file_range 交给内核完成（Btrfs/XFS/NFS 上为 reflink 或服务端复制）"""
+        # 以 x 模式打开目标，已存在时抛出 FileExistsError，交由调用方删除重试
+        # 读取端自己控制缓冲区大小，关闭 Python 的缓冲层；
+        # 写入端保留缓冲层，由它处理短写，避免静默丢数据
+        with open(src, 'rb', buffering=0) as fsrc:
+            fdst = open(dst, 'xb')
+            try:
+                with fdst:
+                    size = os.fstat(fsrc.fileno()).st_size
+                    copied = 0
+                    fallback = False
+                    try:
+                        while copied < size:
+                            n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - copied)
+                            if not n:
+                                break
+                            copied += n
+                    except (AttributeError, OSError):
+                        # 平台或文件系统不支持
+                        fallback = True
+                    if not fallback and copied < size:
+                        if copied:
+                            # 复制到一半提前结束（源文件被截断或挂载点异常）
+                            raise OSError(f"复制中断：{copied}/{size} 字节")
+                        # 部分 FUSE/CIFS 挂载不支持时返回 0 而不是报错
+                        fallback = True
+                    if fallback:
+                        # 回退到用户态复制
+                        fsrc.seek(0)
+                        fdst.seek(0)
+                        fdst.truncate()
+                        shutil.copyfileobj(fsrc, fdst, length=_COPY_BUFSIZE)
+            except BaseException:
+                # 任何失败都不能在媒体库里留下不完整的文件
+                os.remove(dst)
+                raise
+        shutil.copystat(src, dst)
+
+    def _plan_transfer(self, files, media, season_num, target_prefix):
+        """
+        生成整理计划，不产生任何文件系统操作
+        :param files: 已按名称排序的 (文件名, 路径, 大小) 列表
+        :return: 源路径、目标路径、(原文件名, 新文件名)、文件大小 四个等长列表
+        """
+        src_paths, dst_paths, names, sizes = [], [], [], []
+        # 同一目标只保留最后一个，避免并发时互相覆盖
+        index = {}
+        # 兜底机制：如果没提取到集数，按文件名顺序强行编号
+        fallback_ep = 1
+        get_episode = self._get_episode
+        # 拼接成 Emby 最喜欢的格式，剧名和季号部分整批不变，只格式化一次
+        season_prefix = f"{media} - S{season_num:02d}E"
+        for name, path, size in files:
+            # 扫描时已按扩展名过滤，文件名中必然有 "."
+            stem, ext = name.rsplit('.', 1)
+            ep = get_episode(stem)
+            if ep is None:
+                ep = fallback_ep
+                fallback_ep += 1
+            new_filename = f"{season_prefix}{ep:02d}.{ext.lower()}"
+            dst = target_prefix + new_filename
+            i = index.get(dst)
+            if i is None:
+                index[dst] = len(dst_paths)
+                src_paths.append(path)
+                dst_paths.append(dst)
+                names.append((name, new_filename))
+                sizes.append(size)
+            else:
+                logger.warn(f"【强制整理】{names[i][0]} 与 {name} 对应同一目标 {new_filename}，"
+                            f"只整理后者，前者保留在源目录")
+                src_paths[i] = path
+                names[i] = (name, new_filename)
+                sizes[i] = size
+        return src_paths, dst_paths, names, sizes
+
+    @staticmethod
+    def _transfer_one(op, src, dst):
+        """整理单个文件，目标位置已有同名文件时删除后重试"""
+        if op is shutil.move and os.path.islink(dst):
+            # 跨文件系统移动会回退到 copy2，它会跟随目标位置的软链接并改写其指向的文件
+            os.remove(dst)
+        try:
+            op(src, dst)
+            if op is os.replace and os.path.lexists(src):
+                # 目标已是源文件的硬链接时 rename 什么也不做却返回成功，需手动删除源文件完成移动
+                os.remove(src)
+        except (FileExistsError, shutil.SameFileError):
+            # 只在冲突时才检查和删除，省去每个文件的 exists 检查
+            # 重复运行时目标已经是指向源文件的链接，直接跳过，不做删除重建
+            if op is os.link:
+                src_st, dst_st = os.stat(src), os.lstat(dst)
+                if src_st.st_ino == dst_st.st_ino and src_st.st_dev == dst_st.st_dev:
+                    return
+            elif op is os.symlink:
+                if os.path.islink(dst) and os.readlink(dst) == src:
+                    return
+            os.remove(dst)
+            op(src, dst)
+
+    @staticmethod
+    def _do_bulk_link(src_paths, dst_paths, target_dir):
+        """
+        批量硬链接：先用 cp -al 把源文件一次性链接到目标目录下的临时目录，再在同一文件系统内重命名
+        :return: 全部成功返回 True，失败返回 False 由调用方逐个文件重新整理
+        """
+        if not shutil.which("cp"):
+            return False
+        staging = None
+        try:
+            staging = tempfile.mkdtemp(prefix=".force_transfer_", dir=target_dir)
+            for i in range(0, len(src_paths), _BULK_LINK_CHUNK):
+                subprocess.run(["cp", "-al", "--", *src_paths[i:i + _BULK_LINK_CHUNK], staging],
+                               check=True, capture_output=True)
+            for src, dst in zip(src_paths, dst_paths):
+                os.replace(os.path.join(staging, os.path.basename(src)), dst)
+            return True
+        except subprocess.CalledProcessError as e:
+            # 异常本身会带上完整的命令行（可能上千个路径），只记录 cp 的错误输出
+            stderr = e.stderr.decode(errors="replace").strip() if e.stderr else ""
+            logger.warn(f"【强制整理】批量硬链接失败，改为逐个文件整理: {stderr or f'cp 返回码 {e.returncode}'}")
+            return False
+        except OSError as e:
+            logger.warn(f"【强制整理】批量硬链接失败，改为逐个文件整理: {e}")
+            return False
+        finally:
+            if staging:
+                shutil.rmtree(staging, ignore_errors=True)
+
     def _do_transfer(self):
         if not self._source_path or not self._target_path or not self._media_name:
             logger.error("【强制整理】源目录、目标目录或媒体名称为空，无法整理")
@@ -79,53 +245,89 @@ class ForceManualTransfer(_PluginBase):
             logger.error(f"【强制整理】源目录不存在：{src_dir}")
             return
 
-        try:
-            season_num = int(self._season)
-        except:
-            season_num = 1
+        if isinstance(self._season, int):
+            season_num = self._season
+        else:
+            try:
+                season_num = int(self._season)
+            except (TypeError, ValueError):
+                season_num = 1
+
+        # scandir 直接返回目录项类型，普通文件无需额外的 stat 调用；
+        # 源目录常是软链接目录，is_file 需跟随软链接
+        with os.scandir(self._source_path) as it:
+            # 只保留 (文件名, 路径, 大小)，不持有 DirEntry/Path 对象，降低大目录下的内存峰值
+            files = []
+            for e in it:
+                if not e.is_file() or not e.name.lower().endswith(self._EXTS_TUPLE):
+                    continue
+                # 只对通过扩展名过滤的条目取 stat（Windows 上 DirEntry 自带，无额外系统调用）
+                try:
+                    # 跟随软链接，统计的是实际媒体文件的大小
+                    size = e.stat().st_size
+                except FileNotFoundError:
+                    # 读取目录后文件已被删除或软链接已失效，跳过而不是中断整个任务
+                    continue
+                files.append((e.name, e.path, size))
+        # 没有可整理的文件时直接结束，不创建目标目录也不发送通知
+        if not files:
+            logger.info("【强制整理】源目录中没有可整理的媒体文件，跳过")
+            return
 
         # 按照 Emby 完美识别标准创建目标目录结构
         target_dir = Path(self._target_path) / self._media_name / f"Season {season_num}"
-        target_dir.mkdir(parents=True, exist_ok=True)
+        target_key = str(target_dir)
+        # 目录通常早已存在，先 stat（移动方式还要用到 st_dev），不存在时才创建
+        try:
+            target_st = os.stat(target_key)
+        except FileNotFoundError:
+            os.makedirs(target_key, exist_ok=True)
+            target_st = os.stat(target_key)
+        # 循环内直接拼接字符串路径，不再为每个文件构造 Path 对象
+        target_prefix = f"{target_dir}{os.sep}"
 
-        success_count = 0
-        files = [f for f in src_dir.iterdir() if f.is_file() and f.suffix.lower() in self._exts]
-        
-        # 兜底机制：如果没提取到集数，按字母顺序强行编号
-        files.sort(key=lambda x: x.name)
-        fallback_ep = 1
+        op = self._op
+        # 同一文件系统内移动直接用 os.replace（一次原子 rename，且会覆盖目标）
+        if op is shutil.move and os.stat(self._source_path).st_dev == target_st.st_dev:
+            op = os.replace
 
-        for file in files:
-            ep = self._get_episode(file.stem)
-            if ep is None:
-                ep = fallback_ep
-                fallback_ep += 1
-            
-            ext = file.suffix.lower()
-            # 拼接成 Emby 最喜欢的格式
-            new_filename = f"{self._media_name} - S{season_num:02d}E{ep:02d}{ext}"
-            new_filepath = target_dir / new_filename
+        # 按自然顺序排序，保证兜底编号与集数顺序一致（排序键只计算一次）
+        files.sort(key=lambda x: _natkey(x[0]))
+        _err = logger.error
 
-            if new_filepath.exists():
-                new_filepath.unlink() # 如果目标位置已有同名文件，先删除防止冲突
+        # 第一阶段：纯字符串计算出整理计划；第二阶段：只负责执行系统调用
+        src_paths, dst_paths, names, sizes = self._plan_transfer(
+            files, self._media_name, season_num, target_prefix)
 
-            try:
-                if self._transfer_type == "move":
-                    shutil.move(str(file), str(new_filepath))
-                elif self._transfer_type == "copy":
-                    shutil.copy2(str(file), str(new_filepath))
-                elif self._transfer_type == "link":
-                    os.link(str(file), str(new_filepath))
-                elif self._transfer_type == "softlink":
-                    os.symlink(str(file), str(new_filepath))
-                
-                logger.info(f"【强制整理】{file.name} -> {new_filename}")
-                success_count += 1
-            except Exception as e:
-                logger.error(f"【强制整理】处理文件 {file.name} 失败: {e}")
+        # 每个文件互不相关，并发执行以掩盖网络存储上每次系统调用的往返延迟
+        # 成功记录先缓存，结束后按计划顺序汇总输出一次日志，避免每个文件都走一遍日志处理器
+        done = []
+        if op is os.link and self._bulk_link and self._do_bulk_link(src_paths, dst_paths, target_key):
+            done = list(range(len(dst_paths)))
+        else:
+            with ThreadPoolExecutor(max_workers=min(16, len(dst_paths))) as executor:
+                futures = {
+                    executor.submit(self._transfer_one, op, src, dst): i
+                    for i, (src, dst) in enumerate(zip(src_paths, dst_paths))
+                }
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        future.result()
+                        done.append(i)
+                    except Exception as e:
+                        _err(f"【强制整理】处理文件 {names[i][0]} 失败: {e}")
+            done.sort()
+        success_count = len(done)
+        total_bytes = sum(sizes[i] for i in done)
+        if done:
+            ops_log = [f"{names[i][0]} -> {names[i][1]}" for i in done]
+            logger.info(f"【强制整理】共处理 {success_count} 个文件：\n" + "\n".join(ops_log))
 
         # 发送处理完成通知
-        msg = f"剧集: {self._media_name}\n共处理: {success_count} 个文件\n方式: {self._transfer_type}"
+        msg = (f"剧集: {self._media_name}\n"
+               f"共处理: {success_count} 个文件 ({total_bytes / (1 << 20):.1f} MiB)\n"
+               f"方式: {self._transfer_type}")
         self.post_message(mtype=NotificationType.Manual, title="强制整理成功", text=msg)
 
     def get_state(self) -> bool:
@@ -148,13 +350,18 @@ class ForceManualTransfer(_PluginBase):
                         'content': [
                             {
                                 'component': 'VCol',
-                                'props': {'cols': 12, 'md': 6},
+                                'props': {'cols': 12, 'md': 4},
                                 'content': [{'component': 'VSwitch', 'props': {'model': 'enabled', 'label': '启用插件'}}]
                             },
                             {
                                 'component': 'VCol',
-                                'props': {'cols': 12, 'md': 6},
+                                'props': {'cols': 12, 'md': 4},
                                 'content': [{'component': 'VSwitch', 'props': {'model': 'run_now', 'label': '立即运行 (执行完毕开关会自动回弹关闭)'}}]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {'cols': 12, 'md': 4},
+                                'content': [{'component': 'VSwitch', 'props': {'model': 'bulk_link', 'label': '硬链接批量模式 (调用 cp -al，适合大量文件)'}}]
                             }
                         ]
                     },
@@ -217,7 +424,8 @@ class ForceManualTransfer(_PluginBase):
             "target_path": "",
             "media_name": "",
             "season": "1",
-            "transfer_type": "softlink"
+            "transfer_type": "softlink",
+            "bulk_link": False
         }
 
     def get_page(self) -> List[dict]: